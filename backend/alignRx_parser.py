@@ -9,9 +9,9 @@ import json
 import re
 import pandas as pd
 import sys
-from azure.azure_blob_container_client import AzureBlobContainerClient
+from azure.azure_blob_container_client import get_shared_container_client
 import datetime
-from azure.azure_alignRx_search_setup import AlignRxSearchService
+from azure.azure_alignRx_search_setup import get_alignrx_search_service
 
 class DuplicateReportError(Exception):
     """Exception raised when a report already exists in the search index"""
@@ -19,9 +19,9 @@ class DuplicateReportError(Exception):
 
 class AlignRxParser:
     def __init__(self):
-        self.search_service = AlignRxSearchService()
+        self.search_service = get_alignrx_search_service()
         
-        self.azure_client = AzureBlobContainerClient(connection_string=os.getenv("AZURE_STORAGE_CONNECTION_STRING"), container_name='alignrx-reports')
+        self.azure_client = get_shared_container_client(os.getenv("AZURE_STORAGE_CONNECTION_STRING"), 'alignrx-reports')
 
         
 
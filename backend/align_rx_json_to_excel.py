@@ -1,13 +1,39 @@
 """Utilities to load AlignRx report records from Azure AI Search, convert to DataFrame, analyze, and export to Excel."""
 
 import os
-from datetime import datetime, date
+from datetime import date
 from pathlib import Path
 from typing import List, Dict
 
 import pandas as pd
-import openpyxl  
-from azure.azure_alignRx_search_setup import AlignRxSearchService
+from azure.azure_alignRx_search_setup import get_alignrx_search_service
+
+# Fields selected from the index; also the column order of the raw DataFrame
+ALIGNRX_SELECT_FIELDS = [
+    "report_id",
+    "source_file",
+    "pay_date",
+    "destination",
+    "processing_fee",
+    "payment_amount",
+    "central_payments",
+]
+
+# Per-payment fields carried by each central_payments entry
+CENTRAL_PAYMENT_FIELDS = ["sender", "check_num", "amount"]
+
+# "reports" sheet: source column -> Excel header, in sheet order
+REPORT_SHEET_COLUMNS = {
+    "destination": "Destination",
+    "pay_date": "Pay Date",
+    "payment_amount": "Payment Amount",
+}
+
+# "central_payments" sheet column order
+CENTRAL_PAYMENT_SHEET_COLUMNS = [
+    "report_id", "pay_date", "destination", "payment_amount",
+    "sender", "check_num", "amount", "source_file",
+]
 
 class AlignRxDataLoader:
     def __init__(self, start_date: str, end_date: str):
@@ -15,22 +41,19 @@ class AlignRxDataLoader:
         self.end_date = end_date
         # Initialize Azure AI Search service (preferred data source)
     
-        self.search_service = AlignRxSearchService()
+        self.search_service = get_alignrx_search_service()
         # No blob fallback for AlignRx flow
         
 
 
     def _parse_date(self, value: str) -> date:
         """Parse YYYY-MM-DD string to date."""
-        return datetime.strptime(value, "%Y-%m-%d").date()
-
-
-    def _within_range(self, d: str, start: date, end: date) -> bool:
-        """Check if date string YYYY-MM-DD is within [start, end] inclusive."""
-        try:
-            return start <= self._parse_date(d) <= end
-        except Exception:
-            return False
+        # fromisoformat also accepts other ISO forms (YYYYMMDD, 2024-W01-1); the raw
+        # value goes into OData filters, so it must round-trip as YYYY-MM-DD
+        parsed = date.fromisoformat(value)
+        if parsed.isoformat() != value:
+            raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+        return parsed
 
     def _deduplicate_records(self, records: List[Dict]) -> List[Dict]:
         """
@@ -128,15 +151,7 @@ class AlignRxDataLoader:
         records: List[Dict] = []
 
         # Select only fields needed downstream; include all core fields
-        select_fields = [
-            "report_id",
-            "source_file",
-            "pay_date",
-            "destination",
-            "processing_fee",
-            "payment_amount",
-            "central_payments",
-        ]
+        select_fields = ALIGNRX_SELECT_FIELDS
 
         while True:
             results = self.search_service.search_client.search( # type: ignore
@@ -178,18 +193,33 @@ class AlignRxDataLoader:
         # Deduplicate records first to handle race condition duplicates
         records = self._deduplicate_records(records or [])
         
-        df = pd.DataFrame(records)
+        df = pd.DataFrame.from_records(records, columns=ALIGNRX_SELECT_FIELDS)
         if df.empty:
             return df
 
         # Normalize types
         if "pay_date" in df.columns:
-            df["pay_date"] = pd.to_datetime(df["pay_date"], errors="coerce").dt.date
+            df["pay_date"] = pd.to_datetime(df["pay_date"], errors="coerce", cache=True).dt.date
         if "payment_amount" in df.columns:
             df["payment_amount"] = pd.to_numeric(df["payment_amount"], errors="coerce")
         return df
 
 
+    def _expand_central_payments(self, df: pd.DataFrame, report_columns: List[str]) -> pd.DataFrame:
+        """Return one row per central payment, joined with the given report-level columns."""
+        if df is None or df.empty or "central_payments" not in df.columns:
+            return pd.DataFrame()
+
+        report_columns = [c for c in report_columns if c in df.columns]
+        has_payments = df["central_payments"].map(lambda v: isinstance(v, list) and len(v) > 0)
+        exploded = df.loc[has_payments, report_columns + ["central_payments"]].explode("central_payments", ignore_index=True)
+        exploded = exploded[exploded["central_payments"].map(lambda p: isinstance(p, dict))]
+        if exploded.empty:
+            return pd.DataFrame()
+
+        payments = pd.DataFrame.from_records(exploded["central_payments"].tolist(), columns=CENTRAL_PAYMENT_FIELDS)
+        return pd.concat([exploded[report_columns].reset_index(drop=True), payments], axis=1)
+
     def analyze(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
         """Compute aggregations for AlignRx reports with nested central payments."""
         if df.empty:
@@ -212,34 +242,24 @@ class AlignRxDataLoader:
 
         # Daily totals (payment and fee)
         if "pay_date" in df.columns:
-            daily_pay = (
+            # Sum payments and fees per day in a single groupby pass
+            amount_cols = [c for c in ("payment_amount", "processing_fee") if c in df.columns]
+            daily = (
                 df.dropna(subset=["pay_date"])  # type: ignore[arg-type]
-                .groupby("pay_date", dropna=False)["payment_amount"]
+                .groupby("pay_date")[amount_cols]
                 .sum(min_count=1)
                 .reset_index()
-                .rename(columns={"payment_amount": "sum_payment_amount"})
+                .rename(columns={"payment_amount": "sum_payment_amount", "processing_fee": "sum_processing_fee"})
             )
-            if "processing_fee" in df.columns:
-                daily_fee = (
-                    df.dropna(subset=["pay_date"])  # type: ignore[arg-type]
-                    .groupby("pay_date", dropna=False)["processing_fee"]
-                    .sum(min_count=1)
-                    .reset_index()
-                    .rename(columns={"processing_fee": "sum_processing_fee"})
-                )
-                daily = pd.merge(daily_pay, daily_fee, on="pay_date", how="outer")
-            else:
-                daily = daily_pay
         else:
             daily = pd.DataFrame()
 
         # By destination (payment amounts)
         if "destination" in df.columns:
             by_destination = (
-                df.groupby("destination", dropna=False)["payment_amount"]
-                .agg(["count", "sum", "mean"])
+                df.groupby("destination", dropna=False, observed=True)["payment_amount"]
+                .agg(count="count", sum_payment_amount="sum", avg_payment_amount="mean")
                 .reset_index()
-                .rename(columns={"sum": "sum_payment_amount", "mean": "avg_payment_amount"})
                 .sort_values("sum_payment_amount", ascending=False)
             )
         else:
@@ -248,27 +268,12 @@ class AlignRxDataLoader:
         # By sender from nested central_payments
         if "central_payments" in df.columns:
             # Expand list of dicts into rows
-            rows = []
-            for _, rec in df.iterrows():
-                payments = rec.get("central_payments") or []
-                if isinstance(payments, list):
-                    for p in payments:
-                        if isinstance(p, dict):
-                            rows.append({
-                                "sender": p.get("sender"),
-                                "check_num": p.get("check_num"),
-                                "amount": p.get("amount"),
-                                "report_id": rec.get("report_id"),
-                                "pay_date": rec.get("pay_date"),
-                                "destination": rec.get("destination"),
-                            })
-            nested_df = pd.DataFrame(rows)
+            nested_df = self._expand_central_payments(df, ["report_id", "pay_date", "destination"])
             if not nested_df.empty:
                 by_sender = (
-                    nested_df.groupby("sender", dropna=False)["amount"]
-                    .agg(["count", "sum", "mean"])
+                    nested_df.groupby("sender", dropna=False, observed=True)["amount"]
+                    .agg(num_checks="count", sum_amount="sum", avg_amount="mean")
                     .reset_index()
-                    .rename(columns={"count": "num_checks", "sum": "sum_amount", "mean": "avg_amount"})
                     .sort_values("sum_amount", ascending=False)
                 )
             else:
@@ -290,42 +295,14 @@ class AlignRxDataLoader:
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
         # Build an expanded view of central payments where each sender/check becomes its own row
-        expanded_rows: List[Dict] = []
-        if df is not None and not df.empty and "central_payments" in df.columns:
-            for _, rec in df.iterrows():
-                payments = rec.get("central_payments") or []
-                if isinstance(payments, list) and payments:
-                    for p in payments:
-                        if not isinstance(p, dict):
-                            continue
-                        expanded_rows.append({
-                            "report_id": rec.get("report_id"),
-                            "pay_date": rec.get("pay_date"),
-                            "destination": rec.get("destination"),
-                            "payment_amount": rec.get("payment_amount"),
-                            "sender": p.get("sender"),
-                            "check_num": p.get("check_num"),
-                            "amount": p.get("amount"),
-                            "source_file": rec.get("source_file"),
-                        })
-        expanded_df = pd.DataFrame(expanded_rows)
-
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+        expanded_df = self._expand_central_payments(df, ["report_id", "pay_date", "destination", "payment_amount", "source_file"])
+        if not expanded_df.empty:
+            expanded_df = expanded_df.reindex(columns=CENTRAL_PAYMENT_SHEET_COLUMNS)
+
+        with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
             # Report-level data (one row per report) - only Destination, Pay Date, Payment Amount
             if df is not None and not df.empty:
-                selected_cols = []
-                rename_map: Dict[str, str] = {}
-                if "destination" in df.columns:
-                    selected_cols.append("destination")
-                    rename_map["destination"] = "Destination"
-                if "pay_date" in df.columns:
-                    selected_cols.append("pay_date")
-                    rename_map["pay_date"] = "Pay Date"
-                if "payment_amount" in df.columns:
-                    selected_cols.append("payment_amount")
-                    rename_map["payment_amount"] = "Payment Amount"
-
-                reports_df = df[selected_cols].rename(columns=rename_map) if selected_cols else pd.DataFrame()
+                reports_df = df.reindex(columns=list(REPORT_SHEET_COLUMNS)).rename(columns=REPORT_SHEET_COLUMNS)
             else:
                 reports_df = pd.DataFrame()
 
@@ -4,22 +4,37 @@ This script sets up the search index and uploads your processed data
 """
 
 import os
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+import requests
+from requests.adapters import HTTPAdapter
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+# Delete batches sent to the index concurrently when clearing it
+DELETE_MAX_CONCURRENCY = 8
+# Keep-alive pool shared by the index and search clients; sized for the delete workers
+SEARCH_POOL_MAXSIZE = 2 * DELETE_MAX_CONCURRENCY
+# Retry settings for bulk maintenance runs (clear/apply scripts); throttled
+# (429/503) requests back off exponentially and honour Retry-After instead of
+# failing the batch. The app singleton keeps the SDK default retry policy so a
+# throttled index cannot stall request handlers for minutes.
+BULK_RETRY_OPTIONS = {"retry_total": 8, "retry_backoff_factor": 1.5, "retry_backoff_max": 60}
+
 class AlignRxSearchService:
     """Service to manage alignRx reports in Azure AI Search"""
     
-    def __init__(self):
-        """Initialize the AlignRxSearchService"""
+    def __init__(self, retry_options: Optional[Dict] = None):
+        """Initialize the AlignRxSearchService; retry_options tune the SDK RetryPolicy"""
         endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
         api_key = os.getenv("AZURE_SEARCH_API_KEY")
         index_name = os.getenv("AZURE_ALIGN_RX_SEARCH_INDEX_NAME", "alignrx-reports")
@@ -28,16 +43,25 @@ class AlignRxSearchService:
         self.api_key = api_key
         self.index_name = index_name
         self.credential = AzureKeyCredential(api_key)
-        
+        retry_options = retry_options or {}
+
+        # One keep-alive session so both clients reuse TLS connections
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=SEARCH_POOL_MAXSIZE))
+
         # Initialize clients
         self.index_client = SearchIndexClient(
             endpoint=endpoint,
-            credential=self.credential
+            credential=self.credential,
+            transport=RequestsTransport(session=self.session, session_owner=False),
+            **retry_options
         )
         self.search_client = SearchClient(
             endpoint=endpoint,
             index_name=index_name,
-            credential=self.credential
+            credential=self.credential,
+            transport=RequestsTransport(session=self.session, session_owner=False),
+            **retry_options
         )
 
     def upload_documents(self, documents: List[Dict]) -> bool:
@@ -134,10 +158,12 @@ class AlignRxSearchService:
             
             # Build filter expression for exact matching
             # pay_date is DateTimeOffset, destination is string, payment_amount is double
+            # OData string literals escape a single quote by doubling it
+            escaped_destination = destination.replace("'", "''")
             filter_expr = (
                 f"pay_date ge {date_start} and pay_date le {date_end} and "
-                f"destination eq '{destination}' and "
-                f"payment_amount eq {payment_amount}"
+                f"destination eq '{escaped_destination}' and "
+                f"payment_amount eq {float(payment_amount)}"
             )
             
             # Use filter parameter for exact matching (not search_text)
@@ -212,17 +238,25 @@ class AlignRxSearchService:
                     "message": "No documents found to delete"
                 }
             
-            # Delete documents in batches
+            # Delete documents in batches, several requests in flight at once
+            def delete_batch(start: int) -> int:
+                batch = all_doc_ids[start:start + batch_size]
+                result = self.search_client.delete_documents(documents=batch)
+                successful = sum(1 for r in result if r.succeeded)
+                logger.info(f"Deleted batch {start//batch_size + 1}: {successful}/{len(batch)} documents")
+                return successful
+
             total_deleted = 0
-            for i in range(0, len(all_doc_ids), batch_size):
-                batch = all_doc_ids[i:i + batch_size]
-                try:
-                    result = self.search_client.delete_documents(documents=batch)
-                    successful = sum(1 for r in result if r.succeeded)
-                    total_deleted += successful
-                    logger.info(f"Deleted batch {i//batch_size + 1}: {successful}/{len(batch)} documents")
-                except Exception as batch_error:
-                    logger.error(f"Error deleting batch {i//batch_size + 1}: {batch_error}")
+            with ThreadPoolExecutor(max_workers=DELETE_MAX_CONCURRENCY) as executor:
+                futures = {
+                    executor.submit(delete_batch, start): start
+                    for start in range(0, len(all_doc_ids), batch_size)
+                }
+                for future in as_completed(futures):
+                    try:
+                        total_deleted += future.result()
+                    except Exception as batch_error:
+                        logger.error(f"Error deleting batch {futures[future]//batch_size + 1}: {batch_error}")
             
             logger.info(f"Total documents deleted: {total_deleted}/{len(all_doc_ids)}")
             
@@ -265,4 +299,10 @@ class AlignRxSearchService:
     #     if not endpoint or not api_key:
     #         raise ValueError("Please set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY in backend/.env or environment")
 
-    #     return AlignRxSearchService(endpoint, api_key, index_name=index_name)
\ No newline at end of file
+    #     return AlignRxSearchService(endpoint, api_key, index_name=index_name)
+
+
+@lru_cache(maxsize=1)
+def get_alignrx_search_service() -> AlignRxSearchService:
+    """Return the process-wide AlignRxSearchService, created on first use."""
+    return AlignRxSearchService()
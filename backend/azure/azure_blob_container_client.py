@@ -6,15 +6,25 @@ This module provides a client for interacting with Azure Blob Storage containers
 from azure.storage.blob import BlobServiceClient
 
 import os
+from functools import lru_cache
+from typing import IO, Optional, Union
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Uploads larger than one block are split and sent in parallel
+BLOB_BLOCK_SIZE = 4 * 1024 * 1024
+BLOB_UPLOAD_MAX_CONCURRENCY = int(os.getenv("BLOB_UPLOAD_MAX_CONCURRENCY", "8"))
+
 class AzureBlobContainerClient:
     def __init__(self, connection_string: str, container_name: str):
         self.connection_string = connection_string
         self.container_name = container_name
-        self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            max_block_size=BLOB_BLOCK_SIZE,
+            max_single_put_size=BLOB_BLOCK_SIZE,
+        )
         self.container_client = self.blob_service_client.get_container_client(container_name)
         # Ensure the container exists
         try:
@@ -27,9 +37,27 @@ class AzureBlobContainerClient:
     
     def list_blobs(self):
         return self.container_client.list_blobs()
+
+    def blob_exists(self, blob_name: str) -> bool:
+        """Check whether a blob with this name is already in the container."""
+        return self.container_client.get_blob_client(blob_name).exists()
     
-    def upload_blob(self, blob_name: str, data: bytes, overwrite: bool = True):
-        self.container_client.upload_blob(name=blob_name, data=data, overwrite=overwrite)
+    def upload_blob(self, blob_name: str, data: Union[bytes, IO[bytes]], overwrite: bool = True,
+                    length: Optional[int] = None, max_concurrency: int = BLOB_UPLOAD_MAX_CONCURRENCY, **kwargs):
+        """Upload bytes or a readable stream; pass length when uploading a stream.
+
+        Extra keyword arguments (e.g. content_settings) go to the SDK upload call.
+        """
+        if length is None and isinstance(data, (bytes, bytearray)):
+            length = len(data)
+        self.container_client.upload_blob(
+            name=blob_name,
+            data=data,
+            overwrite=overwrite,
+            length=length,
+            max_concurrency=max_concurrency,
+            **kwargs,
+        )
     
     def download_blob(self, blob_name: str):
         return self.container_client.download_blob(blob_name)
@@ -55,6 +83,12 @@ class AzureBlobContainerClient:
         return blob_client.url
 
 
+@lru_cache(maxsize=None)
+def get_shared_container_client(connection_string: str, container_name: str) -> AzureBlobContainerClient:
+    """Return one client per container for the whole process; the underlying SDK client is thread-safe."""
+    return AzureBlobContainerClient(connection_string, container_name)
+
+
 def main():
     connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
     container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
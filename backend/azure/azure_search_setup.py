@@ -4,16 +4,51 @@ This script sets up the search index and uploads your processed data
 """
 
 import os
+from functools import lru_cache
 from typing import List, Dict
 from dotenv import load_dotenv
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.policies import ContentDecodePolicy
 import logging
 
+try:
+    import orjson
+except ImportError:  # fall back to the SDK's stdlib json decoding
+    orjson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def install_fast_json_decoder() -> bool:
+    """Decode Azure SDK JSON response bodies with orjson when it is available.
+
+    Search responses can carry up to 1000 documents per page, so the decode
+    step is a noticeable share of large range queries. Bodies orjson rejects
+    fall through to the SDK's own decoder.
+    """
+    if orjson is None or getattr(ContentDecodePolicy, "_fast_json_installed", False):
+        return orjson is not None
+
+    sdk_deserialize_from_text = ContentDecodePolicy.deserialize_from_text.__func__
+
+    def deserialize_from_text(cls, data, mime_type=None, response=None):
+        if data and isinstance(data, (str, bytes)) and mime_type and cls.JSON_REGEXP.match(mime_type):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass
+        return sdk_deserialize_from_text(cls, data, mime_type, response)
+
+    ContentDecodePolicy.deserialize_from_text = classmethod(deserialize_from_text)
+    ContentDecodePolicy._fast_json_installed = True
+    return True
+
+
+install_fast_json_decoder()
+
 class EDISearchService:
     """Service to manage EDI transactions in Azure AI Search"""
     
@@ -130,4 +165,10 @@ def setup_azure_search_from_env():
     if not endpoint or not api_key:
         raise ValueError("Please set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY in backend/.env or environment")
 
-    return EDISearchService(endpoint, api_key, index_name=index_name)
\ No newline at end of file
+    return EDISearchService(endpoint, api_key, index_name=index_name)
+
+
+@lru_cache(maxsize=1)
+def get_edi_search_service() -> EDISearchService:
+    """Return the process-wide EDISearchService, created on first use."""
+    return setup_azure_search_from_env()
@@ -2,21 +2,71 @@
 
 import os
 import json
-from datetime import datetime, date
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
 from typing import List, Dict, Optional
 
 import pandas as pd
-import openpyxl  
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from azure.core.exceptions import HttpResponseError
 from azure.azure_blob_container_client import AzureBlobContainerClient
-from azure.azure_search_setup import setup_azure_search_from_env
+from azure.azure_search_setup import get_edi_search_service
+
+logger = logging.getLogger(__name__)
+
+# Azure AI Search returns at most 1000 documents per request
+SEARCH_PAGE_SIZE = 1000
+# Number of id shards paged concurrently
+MAX_CONCURRENT_PAGES = 8
+
+# Document ids are decimal strings ("1", "2", ...). Splitting on the leading
+# character gives disjoint, lexicographically ordered shards that can each be
+# paged independently with an `id gt '<last id>'` cursor. Only ranges that fill
+# the first page fan out over the shards.
+ID_SHARD_BOUNDARIES = [None, "2", "3", "4", "5", "6", "7", "8", "9", None]
+
+# Recent date-range queries are served from memory for this many seconds
+SEARCH_CACHE_TTL_SECONDS = 90
+_search_records_cache = TTLCache(maxsize=128, ttl=SEARCH_CACHE_TTL_SECONDS)
+_search_records_lock = threading.Lock()
+
+
+def clear_search_records_cache():
+    """Forget cached search results, e.g. after new transactions are indexed."""
+    with _search_records_lock:
+        _search_records_cache.clear()
+
+# Fields selected from the index; also the column order of the raw DataFrame
+EDI_SELECT_FIELDS = [
+    "trace_number",
+    "amount",
+    "effective_date",
+    "originator",
+    "receiver",
+    "page_number",
+    "routing_id_credit",
+    "routing_id_debit",
+    "company_id_debit",
+    "mutually_defined",
+    "file_name",
+]
+
+# Low-cardinality text columns stored as categoricals for cheaper groupbys
+EDI_CATEGORY_FIELDS = ["originator", "receiver"]
+
+# Fields analyze() reads; enough for the summary endpoints that return no raw rows
+EDI_ANALYSIS_FIELDS = ["amount", "effective_date", "originator", "receiver"]
 
 class EDIDataLoader:
     def __init__(self, start_date: str, end_date: str):
         self.start_date = start_date
         self.end_date = end_date
         # Initialize Azure AI Search service (preferred data source)
-        self.search_service = setup_azure_search_from_env()
+        self.search_service = get_edi_search_service()
         # Kept for backward compatibility but unused in search mode
         self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         self.json_container_name = os.getenv("AZURE_JSON_STORAGE_CONTAINER_NAME", "edi-json-structured")
@@ -26,60 +76,109 @@ class EDIDataLoader:
 
     def _parse_date(self, value: str) -> date:
         """Parse YYYY-MM-DD string to date."""
-        return datetime.strptime(value, "%Y-%m-%d").date()
+        # fromisoformat also accepts other ISO forms (YYYYMMDD, 2024-W01-1); the raw
+        # value goes into OData filters, so it must round-trip as YYYY-MM-DD
+        parsed = date.fromisoformat(value)
+        if parsed.isoformat() != value:
+            raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+        return parsed
+
+
+    @cached(
+        cache=_search_records_cache,
+        key=lambda self, start_date, end_date, select=None: hashkey(start_date, end_date, tuple(select or EDI_SELECT_FIELDS)),
+        lock=_search_records_lock,
+    )
+    def _load_search_records(self, start_date: str, end_date: str, select: Optional[List[str]] = None) -> List[Dict]:
+        """Query Azure AI Search for transactions within [start_date, end_date].
+
+        `select` narrows the fields fetched (default: EDI_SELECT_FIELDS).
+        Results are cached per (start_date, end_date, select) for SEARCH_CACHE_TTL_SECONDS
+        and shared between callers, so the returned list must not be mutated.
+        """
+        # effective_date is stored as YYYY-MM-DD string and is filterable; string range works lexicographically
+        filter_expr = f"effective_date ge '{start_date}' and effective_date le '{end_date}'"
 
+        # Select only fields needed downstream; include all core fields unless narrowed
+        select_fields = select or EDI_SELECT_FIELDS
 
-    def _within_range(self, d: str, start: date, end: date) -> bool:
-        """Check if date string YYYY-MM-DD is within [start, end] inclusive."""
+        # One unsharded cursor page answers most ranges with a single request
         try:
-            return start <= self._parse_date(d) <= end
-        except Exception:
-            return False
+            records = self._fetch_cursor_page(filter_expr, select_fields, last_id=None)
+        except HttpResponseError as e:
+            # The cursor needs the index key (id) to be filterable and sortable
+            logger.warning(f"id cursor query rejected, paging with $skip instead: {e}")
+            return self._load_with_skip(filter_expr, select_fields)
+        if len(records) < SEARCH_PAGE_SIZE:
+            return records
+
+        # Larger ranges resume after the first page, paging the remaining id shards concurrently
+        last_id = records[-1]["id"]
+        shard_filters = []
+        for low, high in zip(ID_SHARD_BOUNDARIES, ID_SHARD_BOUNDARIES[1:]):
+            if high and high <= last_id:
+                continue  # fully covered by the first page
+            bounds = [filter_expr]
+            if low:
+                bounds.append(f"id ge '{low}'")
+            if high:
+                bounds.append(f"id lt '{high}'")
+            shard_filters.append(" and ".join(bounds))
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_PAGES) as executor:
+            shards = executor.map(lambda shard_filter: self._load_shard(shard_filter, select_fields, last_id), shard_filters)
+            for shard in shards:
+                records.extend(shard)
 
+        return records
 
-    def _load_search_records(self, start_date: str, end_date: str) -> List[Dict]:
-        """Query Azure AI Search for transactions within [start_date, end_date]."""
-        # effective_date is stored as YYYY-MM-DD string and is filterable; string range works lexicographically
-        filter_expr = f"effective_date ge '{start_date}' and effective_date le '{end_date}'"
 
-        # Page through results using skip/top
-        batch_size = 1000
-        skip = 0
+    def _fetch_cursor_page(self, page_filter: str, select_fields: List[str], last_id: Optional[str]) -> List[Dict]:
+        """Fetch the next page in key order after last_id (from the start when None)."""
+        if last_id is not None:
+            escaped_id = last_id.replace("'", "''")
+            page_filter = f"{page_filter} and id gt '{escaped_id}'"
+        results = self.search_service.search_client.search(
+            search_text="",  # filter-only query
+            filter=page_filter,
+            select=select_fields + ["id"],
+            order_by=["id asc"],
+            top=SEARCH_PAGE_SIZE,
+        )
+        return [dict(r) for r in results]
+
+
+    def _load_shard(self, shard_filter: str, select_fields: List[str], last_id: Optional[str] = None) -> List[Dict]:
+        """Page through one id shard in key order using an `id gt` cursor instead of $skip."""
         records: List[Dict] = []
+        while True:
+            batch = self._fetch_cursor_page(shard_filter, select_fields, last_id)
+            records.extend(batch)
+            if len(batch) < SEARCH_PAGE_SIZE:
+                return records
+            last_id = batch[-1]["id"]
 
-        # Select only fields needed downstream; include all core fields
-        select_fields = [
-            "trace_number",
-            "amount",
-            "effective_date",
-            "originator",
-            "receiver",
-            "page_number",
-            "routing_id_credit",
-            "routing_id_debit",
-            "company_id_debit",
-            "mutually_defined",
-            "file_name",
-        ]
 
+    def _load_with_skip(self, filter_expr: str, select_fields: List[str]) -> List[Dict]:
+        """Page sequentially with skip/top; used when the index key cannot back a cursor."""
+        records: List[Dict] = []
+        skip = 0
         while True:
             results = self.search_service.search_client.search(
                 search_text="",  # filter-only query
                 filter=filter_expr,
                 select=select_fields,
-                top=batch_size,
+                top=SEARCH_PAGE_SIZE,
                 skip=skip,
             )
             batch = [dict(r) for r in results]
             records.extend(batch)
-            if len(batch) < batch_size:
-                break
-            skip += batch_size
-
-        return records
+            if len(batch) < SEARCH_PAGE_SIZE:
+                return records
+            skip += SEARCH_PAGE_SIZE
 
 
-    def load_edi_json(self, start_date: str, end_date: str) -> List[Dict]:
+    def load_edi_json(self, start_date: str, end_date: str, select: Optional[List[str]] = None) -> List[Dict]:
         """Load EDI transaction records from Azure AI Search within the date range.
 
         The `effective_date` is expected in YYYY-MM-DD format.
@@ -88,21 +187,25 @@ class EDIDataLoader:
         _ = self._parse_date(start_date)
         _ = self._parse_date(end_date)
 
-        records = self._load_search_records(start_date, end_date)
+        records = self._load_search_records(start_date, end_date, select)
         return records
 
 
     def to_dataframe(self, records: List[Dict]) -> pd.DataFrame:
         """Convert records to a pandas DataFrame and normalize types."""
-        df = pd.DataFrame(records or [])
+        # Fixed columns keep the sheet layout stable and drop @search.* metadata
+        df = pd.DataFrame.from_records(records or [], columns=EDI_SELECT_FIELDS)
         if df.empty:
             return df
 
         # Normalize types
         if "effective_date" in df.columns:
-            df["effective_date"] = pd.to_datetime(df["effective_date"], errors="coerce").dt.date
+            df["effective_date"] = pd.to_datetime(df["effective_date"], format="%Y-%m-%d", errors="coerce", cache=True).dt.date
         if "amount" in df.columns:
             df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+        for column in EDI_CATEGORY_FIELDS:
+            if column in df.columns:
+                df[column] = df[column].astype("category")
         return df
 
 
@@ -120,8 +223,8 @@ class EDIDataLoader:
         # Summary totals
         totals = pd.DataFrame({
             "count": [len(df)],
-            "sum_amount": [df["amount"].sum(skipna=True) if "amount" in df else 0.0],
-            "avg_amount": [df["amount"].mean(skipna=True) if "amount" in df else 0.0],
+            "sum_amount": [df["amount"].sum(skipna=True)],
+            "avg_amount": [df["amount"].mean(skipna=True)],
         })
 
         # Daily totals
@@ -136,29 +239,8 @@ class EDIDataLoader:
         else:
             daily = pd.DataFrame()
 
-        # By originator
-        if "originator" in df.columns:
-            by_originator = (
-                df.groupby("originator", dropna=False)["amount"]
-                .agg(["count", "sum", "mean"])
-                .reset_index()
-                .rename(columns={"sum": "sum_amount", "mean": "avg_amount"})
-                .sort_values("sum_amount", ascending=False)
-            )
-        else:
-            by_originator = pd.DataFrame()
-
-        # By receiver
-        if "receiver" in df.columns:
-            by_receiver = (
-                df.groupby("receiver", dropna=False)["amount"]
-                .agg(["count", "sum", "mean"])
-                .reset_index()
-                .rename(columns={"sum": "sum_amount", "mean": "avg_amount"})
-                .sort_values("sum_amount", ascending=False)
-            )
-        else:
-            by_receiver = pd.DataFrame()
+        by_originator = self._summarize_by(df, "originator")
+        by_receiver = self._summarize_by(df, "receiver")
 
         return {
             "summary_totals": totals,
@@ -168,12 +250,24 @@ class EDIDataLoader:
         }
 
 
+    def _summarize_by(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        """Count, total and average amount per value of `column`, largest total first."""
+        if column not in df.columns:
+            return pd.DataFrame()
+        return (
+            df.groupby(column, dropna=False, observed=True)["amount"]
+            .agg(count="count", sum_amount="sum", avg_amount="mean")
+            .reset_index()
+            .sort_values("sum_amount", ascending=False)
+        )
+
+
     def export_to_excel(self, df: pd.DataFrame, analyses: Dict[str, pd.DataFrame], excel_path: str) -> str:
         """Export raw data and analyses to an Excel file with multiple sheets."""
         output_path = Path(excel_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+        with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
             (df if not df.empty else pd.DataFrame()).to_excel(writer, index=False, sheet_name="raw")
             for name, adf in analyses.items():
                 (adf if not adf.empty else pd.DataFrame()).to_excel(writer, index=False, sheet_name=name[:31])
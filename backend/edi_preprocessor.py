@@ -1,11 +1,13 @@
 import os
 import re
-import json
+import sys
+import orjson
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from datetime import datetime
 import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from io import BytesIO
 
@@ -16,7 +18,64 @@ from azure.azure_blob_container_client import AzureBlobContainerClient
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Field patterns, compiled once for every extractor instance
+EDI_FIELD_PATTERNS = {
+    'credit_amount': re.compile(r'CREDIT:\s*\$?([\d,]+\.?\d*)', re.MULTILINE),
+    'effective_date': re.compile(r'EFFECTIVE DATE:\s*(\d{2}/\d{2}/\d{4})', re.MULTILINE),
+    'page_number': re.compile(r'PAGE:\s*(\d+)', re.MULTILINE),
+    'routing_id_credit': re.compile(r'ROUTING ID:\s*(\d+)', re.MULTILINE),
+    'demand_acct': re.compile(r'DEMAND ACCT:\s*(\d+)', re.MULTILINE),
+    'company_id': re.compile(r'COMPANY ID:\s*(\d+)', re.MULTILINE),
+    'trace_number': re.compile(r'TRACE NUMBER:\s*([A-Za-z0-9]+)', re.MULTILINE),
+    'originating_co_id': re.compile(r'ORIGINATING CO ID:\s*(\d+)', re.MULTILINE),
+    'receiver': re.compile(r'RECEIVER:\s*([A-Za-z0-9\s/]+?)(?:\n|MUTUALLY)', re.MULTILINE),
+    'mutually_defined': re.compile(r'MUTUALLY DEFINED:\s*(\d+)', re.MULTILINE),
+    'originator': re.compile(r'ORIGINATOR:\s*([A-Za-z0-9\s\-/]+?)(?:\n|$)', re.MULTILINE)
+}
+
+# All fields parse_page_content needs, matched in a single pass over the page.
+# Each alternative has one named group; receiver/originator use lookaheads so
+# the terminator stays available to the next field.
+EDI_PAGE_SCAN_RE = re.compile(
+    r'CREDIT:\s*\$?(?P<credit_amount>[\d,]+\.?\d*)'
+    r'|EFFECTIVE DATE:\s*(?P<effective_date>\d{2}/\d{2}/\d{4})'
+    r'|PAGE:\s*(?P<page_number>\d+)'
+    r'|ROUTING ID:\s*(?P<routing_id>\d+)'
+    r'|DEMAND ACCT:\s*(?P<demand_acct>\d+)'
+    r'|COMPANY ID:\s*(?P<company_id>\d+)'
+    r'|TRACE NUMBER:\s*(?P<trace_number>[A-Za-z0-9]+)'
+    r'|RECEIVER:\s*(?P<receiver>[A-Za-z0-9\s/]+?)(?=\n|MUTUALLY)'
+    r'|MUTUALLY DEFINED:\s*(?P<mutually_defined>\d+)'
+    r'|ORIGINATOR:\s*(?P<originator>[A-Za-z0-9\s\-/]+?)(?=\n|$)',
+    re.MULTILINE
+)
+
+# Page text extraction is pure Python and CPU-bound; large PDFs are split into
+# page ranges extracted in worker processes (batch runs only, see main())
+PDF_EXTRACT_WORKERS = int(os.getenv("EDI_PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = 40
+PDF_PAGES_PER_TASK = 20
+
+
+# Reader private to each extraction worker process, set by _init_extract_worker
+_worker_reader = None
+
+
+def _init_extract_worker(pdf_bytes: bytes) -> None:
+    """Open the PDF once per worker, so its bytes are sent once per process, not per task"""
+    global _worker_reader
+    _worker_reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+
+
+def _extract_page_range(start: int, stop: int) -> List[str]:
+    """Extract text of pages [start, stop) with the worker's reader"""
+    return [_worker_reader.pages[i].extract_text() for i in range(start, stop)]
+
+# Page header that starts each page of a report
+PAGE_HEADER_RE = re.compile(r'NORTH CAROLINA STATE TREASURER.*?PAGE:\s*\d+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+@dataclass(slots=True)
 class Transaction:
     """Data class for EDI transaction"""
     trace_number: str
@@ -32,30 +91,14 @@ class Transaction:
     input_format: str
     demand_account: str
     file_name: str
-    
-    def to_dict(self) -> Dict:
-        """Convert to dictionary for JSON serialization"""
-        return {
-            "trace_number": self.trace_number,
-            "amount": self.amount,
-            "effective_date": self.effective_date,
-            "receiver": self.receiver,
-            "originator": self.originator,
-            "page_number": self.page_number,
-            "routing_id_credit": self.routing_id_credit,
-            "routing_id_debit": self.routing_id_debit,
-            "company_id_debit": self.company_id_debit,
-            "mutually_defined": self.mutually_defined,
-            "input_format": self.input_format,
-            "demand_account": self.demand_account,
-            "file_name": self.file_name
-        }
+
 
 class EDITransactionExtractor:
     """Extract transaction data from EDI PDF reports"""
     
-    def __init__(self, documents_dir: str = "./documents", output_dir: str = "./processed_data"):
+    def __init__(self, documents_dir: str = "./documents", output_dir: str = "./processed_data", max_workers: int = 1):
         self.documents_dir = Path(documents_dir)
+        self.max_workers = max_workers
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         # Azure configuration
@@ -63,20 +106,8 @@ class EDITransactionExtractor:
         self.azure_source_container = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "")
         self.azure_output_container = os.getenv("EDI_JSON_OUTPUT_CONTAINER", "edi-json-structured")
         
-        # Regex patterns for extracting data
-        self.patterns = {
-            'credit_amount': r'CREDIT:\s*\$?([\d,]+\.?\d*)',
-            'effective_date': r'EFFECTIVE DATE:\s*(\d{2}/\d{2}/\d{4})',
-            'page_number': r'PAGE:\s*(\d+)',
-            'routing_id_credit': r'ROUTING ID:\s*(\d+)',
-            'demand_acct': r'DEMAND ACCT:\s*(\d+)',
-            'company_id': r'COMPANY ID:\s*(\d+)',
-            'trace_number': r'TRACE NUMBER:\s*([A-Za-z0-9]+)',
-            'originating_co_id': r'ORIGINATING CO ID:\s*(\d+)',
-            'receiver': r'RECEIVER:\s*([A-Za-z0-9\s/]+?)(?:\n|MUTUALLY)',
-            'mutually_defined': r'MUTUALLY DEFINED:\s*(\d+)',
-            'originator': r'ORIGINATOR:\s*([A-Za-z0-9\s\-/]+?)(?:\n|$)'
-        }
+        # Compiled regex patterns for extracting data
+        self.patterns = EDI_FIELD_PATTERNS
         
     
     def extract_text_from_pdf(self, pdf_path: Path) -> str:
@@ -84,10 +115,10 @@ class EDITransactionExtractor:
         try:
             with open(pdf_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                if self._use_parallel_extraction(reader):
+                    file.seek(0)
+                    return self._extract_text_parallel(file.read(), len(reader.pages))
+                return "".join(page.extract_text() + "\n" for page in reader.pages)
         except Exception as e:
             logger.error(f"Error reading PDF {pdf_path}: {e}")
             return ""
@@ -97,88 +128,110 @@ class EDITransactionExtractor:
         try:
             with BytesIO(pdf_bytes) as byte_stream:
                 reader = PyPDF2.PdfReader(byte_stream)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                if self._use_parallel_extraction(reader):
+                    return self._extract_text_parallel(pdf_bytes, len(reader.pages))
+                return "".join(page.extract_text() + "\n" for page in reader.pages)
         except Exception as e:
             logger.error(f"Error reading PDF from bytes: {e}")
             return ""
+
+    def _use_parallel_extraction(self, reader) -> bool:
+        return self.max_workers > 1 and len(reader.pages) >= PDF_PARALLEL_MIN_PAGES
+
+    def _extract_text_parallel(self, pdf_bytes: bytes, page_count: int) -> str:
+        """Extract page text across worker processes, keeping page order"""
+        starts = range(0, page_count, PDF_PAGES_PER_TASK)
+        stops = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+        with ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(stops)),
+            initializer=_init_extract_worker,
+            initargs=(pdf_bytes,),
+        ) as executor:
+            chunks = executor.map(_extract_page_range, starts, stops)
+            return "".join(page_text + "\n" for chunk in chunks for page_text in chunk)
     
     def parse_page_content(self, page_text: str, file_name: str) -> Optional[Transaction]:
         """Parse a single page to extract transaction data"""
         try:
-            # Extract all required fields
-            credit_match = re.search(self.patterns['credit_amount'], page_text)
-            if not credit_match:
+            # Collect every field in one scan; repeated labels keep page order
+            hits: Dict[str, List[str]] = {}
+            for match in EDI_PAGE_SCAN_RE.finditer(page_text):
+                hits.setdefault(match.lastgroup, []).append(match.group(match.lastgroup))
+
+            def first(field_name: str) -> str:
+                values = hits.get(field_name)
+                return self._clean_field(field_name, values[0].strip()) if values else ""
+
+            if 'credit_amount' not in hits:
                 return None
             
-            amount_str = credit_match.group(1).replace(',', '')
+            amount_str = hits['credit_amount'][0].replace(',', '')
             amount = float(amount_str)
             
             # Extract other fields
-            effective_date = self._extract_field(page_text, 'effective_date')
-            page_number = self._extract_field(page_text, 'page_number')
+            effective_date = first('effective_date')
+            page_number = first('page_number')
             
             # Get routing IDs (first one is credit, second is debit)
-            routing_ids = re.findall(self.patterns['routing_id_credit'], page_text)
+            routing_ids = hits.get('routing_id', [])
             routing_id_credit = routing_ids[0] if len(routing_ids) > 0 else ""
             routing_id_debit = routing_ids[1] if len(routing_ids) > 1 else ""
             
-            demand_acct = self._extract_field(page_text, 'demand_acct')
+            demand_acct = first('demand_acct')
             
             # Get company IDs (debit party company ID)
-            company_ids = re.findall(self.patterns['company_id'], page_text)
+            company_ids = hits.get('company_id', [])
             company_id_debit = company_ids[1] if len(company_ids) > 1 else (company_ids[0] if company_ids else "")
             
             # Get trace numbers (first one is the primary)
-            trace_numbers = re.findall(self.patterns['trace_number'], page_text)
+            trace_numbers = hits.get('trace_number', [])
             trace_number = trace_numbers[0] if trace_numbers else ""
             
-            receiver = self._extract_field(page_text, 'receiver', clean_receiver=True)
-            mutually_defined = self._extract_field(page_text, 'mutually_defined')
-            originator = self._extract_field(page_text, 'originator', clean_originator=True)
+            receiver = first('receiver')
+            mutually_defined = first('mutually_defined')
+            originator = first('originator')
             
             # Convert date format from MM/DD/YYYY to YYYY-MM-DD
             formatted_date = self._format_date(effective_date)
             
+            # Parties, routing/company IDs and file names repeat across thousands of
+            # transactions; intern them so each distinct value is stored once
             return Transaction(
                 trace_number=trace_number,
                 amount=amount,
                 effective_date=formatted_date,
-                receiver=receiver,
-                originator=originator,
+                receiver=sys.intern(receiver),
+                originator=sys.intern(originator),
                 page_number=page_number,
-                routing_id_credit=routing_id_credit,
-                routing_id_debit=routing_id_debit,
-                company_id_debit=company_id_debit,
+                routing_id_credit=sys.intern(routing_id_credit),
+                routing_id_debit=sys.intern(routing_id_debit),
+                company_id_debit=sys.intern(company_id_debit),
                 mutually_defined=mutually_defined,
                 input_format="ACHCCD+",  # This appears to be standard
                 demand_account=demand_acct,
-                file_name=file_name
+                file_name=sys.intern(file_name)
             )
             
         except Exception as e:
             logger.error(f"Error parsing page content: {e}")
             return None
     
-    def _extract_field(self, text: str, field_name: str, clean_receiver: bool = False, clean_originator: bool = False) -> str:
-        """Extract a field using regex pattern"""
-        match = re.search(self.patterns[field_name], text, re.MULTILINE)
-        if match:
-            value = match.group(1).strip()
-            if clean_receiver and field_name == 'receiver':
-                # Clean up receiver field
-                value = re.sub(r'\s+', ' ', value).strip()
-                value = value.replace('MUTUALLY DEFINED:', '').strip()
-            elif clean_originator and field_name == 'originator':
-                # Clean up originator field
-                value = re.sub(r'\s+', ' ', value).strip()
-            return value
-        return ""
+    def _clean_field(self, field_name: str, value: str) -> str:
+        """Collapse whitespace in receiver/originator names; other fields pass through"""
+        if field_name == 'receiver':
+            value = WHITESPACE_RE.sub(' ', value).strip()
+            value = value.replace('MUTUALLY DEFINED:', '').strip()
+        elif field_name == 'originator':
+            value = WHITESPACE_RE.sub(' ', value).strip()
+        return value
     
     def _format_date(self, date_str: str) -> str:
         """Convert MM/DD/YYYY to YYYY-MM-DD format"""
+        # Fast path: the date regex already guarantees the MM/DD/YYYY shape
+        if len(date_str) == 10 and date_str[2] == '/' == date_str[5]:
+            month, day, year = date_str[0:2], date_str[3:5], date_str[6:10]
+            if (month + day + year).isdigit() and '01' <= month <= '12' and '01' <= day <= '31':
+                return f"{year}-{month}-{day}"
         try:
             if date_str and '/' in date_str:
                 date_obj = datetime.strptime(date_str, '%m/%d/%Y')
@@ -187,22 +240,26 @@ class EDITransactionExtractor:
             pass
         return date_str
     
+    def iter_pages(self, text: str) -> Iterator[str]:
+        """Yield each page of PDF text, header included, one at a time"""
+        # Text before the first page header is not part of any page
+        page_start = None
+        for header in PAGE_HEADER_RE.finditer(text):
+            if page_start is not None:
+                yield text[page_start:header.start()]
+            page_start = header.start()
+        if page_start is not None:
+            yield text[page_start:]
+
     def split_pages(self, text: str) -> List[str]:
         """Split PDF text into individual pages"""
-        # Split by page headers
-        page_pattern = r'NORTH CAROLINA STATE TREASURER.*?PAGE:\s*\d+'
-        pages = re.split(page_pattern, text)
-        
-        # Re-add headers to pages (except first empty split)
-        headers = re.findall(page_pattern, text)
-        
-        result_pages = []
-        for i, page_content in enumerate(pages[1:], 0):
-            if i < len(headers):
-                full_page = headers[i] + page_content
-                result_pages.append(full_page)
-        
-        return result_pages
+        return list(self.iter_pages(text))
+
+    def iter_payment_pages(self, text: str) -> Iterator[str]:
+        """Yield only pages that carry a payment, skipping headers/summaries before any parsing"""
+        for page_text in self.iter_pages(text):
+            if 'PAYMENT INFORMATION:' in page_text and 'CREDIT:' in page_text:
+                yield page_text
     
     def process_file(self, pdf_path: Path) -> List[Transaction]:
         """Process a single PDF file and extract all transactions"""
@@ -212,14 +269,12 @@ class EDITransactionExtractor:
         if not text:
             return []
         
-        pages = self.split_pages(text)
         transactions = []
         
-        for page_text in pages:
-            if 'PAYMENT INFORMATION:' in page_text and 'CREDIT:' in page_text:
-                transaction = self.parse_page_content(page_text, pdf_path.name)
-                if transaction:
-                    transactions.append(transaction)
+        for page_text in self.iter_payment_pages(text):
+            transaction = self.parse_page_content(page_text, pdf_path.name)
+            if transaction:
+                transactions.append(transaction)
         
         logger.info(f"Extracted {len(transactions)} transactions from {pdf_path.name}")
         return transactions
@@ -268,12 +323,10 @@ class EDITransactionExtractor:
                 if not text:
                     continue
 
-                pages = self.split_pages(text)
-                for page_text in pages:
-                    if 'PAYMENT INFORMATION:' in page_text and 'CREDIT:' in page_text:
-                        transaction = self.parse_page_content(page_text, blob_name)
-                        if transaction:
-                            transactions.append(transaction)
+                for page_text in self.iter_payment_pages(text):
+                    transaction = self.parse_page_content(page_text, blob_name)
+                    if transaction:
+                        transactions.append(transaction)
 
             logger.info(f"Extracted {len(transactions)} transactions from Azure blobs")
             return transactions
@@ -285,10 +338,9 @@ class EDITransactionExtractor:
         """Save transactions to JSON file"""
         output_path = self.output_dir / output_filename
         
-        transactions_dict = [t.to_dict() for t in transactions]
-        
-        with open(output_path, 'w') as f:
-            json.dump(transactions_dict, f, indent=2)
+        # orjson serialises the Transaction dataclasses directly, in field order
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(transactions, option=orjson.OPT_INDENT_2))
         
         logger.info(f"Saved {len(transactions)} transactions to {output_path}")
         return output_path
@@ -302,10 +354,9 @@ class EDITransactionExtractor:
         output_client = AzureBlobContainerClient(self.azure_connection_string, output_container)
 
         # Prepare JSON content
-        transactions_dict = [t.to_dict() for t in transactions]
         timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
         blob_name = output_blob_name or f"edi_transactions_{timestamp}.json"
-        data_bytes = json.dumps(transactions_dict, indent=2).encode('utf-8')
+        data_bytes = orjson.dumps(transactions, option=orjson.OPT_INDENT_2)
 
         try:
             output_client.upload_blob(blob_name, data_bytes, overwrite=True)
@@ -345,7 +396,7 @@ class EDITransactionExtractor:
 
 def main():
     """Main function to run the preprocessor using Azure Blob Storage as source and sink."""
-    extractor = EDITransactionExtractor()
+    extractor = EDITransactionExtractor(max_workers=PDF_EXTRACT_WORKERS)
 
     # Prefer Azure blobs; fallback to local if Azure not configured
     if extractor.azure_connection_string and extractor.azure_source_container:
@@ -357,8 +408,8 @@ def main():
             # Prepare search data locally (downstream step can pick from Azure later)
             search_data = extractor.create_search_index_data(transactions)
             search_path = extractor.output_dir / "search_index_data.json"
-            with open(search_path, 'w') as f:
-                json.dump(search_data, f, indent=2)
+            with open(search_path, 'wb') as f:
+                f.write(orjson.dumps(search_data, option=orjson.OPT_INDENT_2))
             logger.info(f"Created search index data at {search_path}")
             print(f"\n--- Azure Processing Summary ---")
             print(f"Total transactions extracted: {len(transactions)}")
@@ -371,8 +422,8 @@ def main():
             json_path = extractor.save_transactions(transactions)
             search_data = extractor.create_search_index_data(transactions)
             search_path = extractor.output_dir / "search_index_data.json"
-            with open(search_path, 'w') as f:
-                json.dump(search_data, f, indent=2)
+            with open(search_path, 'wb') as f:
+                f.write(orjson.dumps(search_data, option=orjson.OPT_INDENT_2))
             logger.info(f"Created search index data at {search_path}")
             print(f"\n--- Local Processing Summary ---")
             print(f"Total transactions extracted: {len(transactions)}")
@@ -1,7 +1,13 @@
 import os
-from typing import List, Dict
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Union
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
 import logging
 from openai import AzureOpenAI
 from azure.ai.projects import AIProjectClient
@@ -13,54 +19,50 @@ from azure.core.credentials import AzureKeyCredential
 from conversation_memory import ConversationMemory
 from conversation_memory import UnifiedConversationMemory
 from fastapi import FastAPI
+from dotenv import load_dotenv
 from azure.azure_search_setup import EDISearchService, setup_azure_search_from_env
 
-import json
+import orjson
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+load_dotenv()
 
-# EDI Search Service Integration
-class EDISearchIntegration:
-    """Integration class for EDI search in Charlotte"""
-    
-    def __init__(self, unified_memory: UnifiedConversationMemory, conversation_memory: ConversationMemory, project_client=None):
-        self.unified_memory = unified_memory
-        self.conversation_memory = conversation_memory
-        self.project_client = project_client
-        self.search_client = None
-        self.setup_search_client()
-    
-    def setup_search_client(self):
-        """Initialize Azure Search client"""
-        try:
-            endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-            api_key = os.getenv("AZURE_SEARCH_API_KEY") 
-            index_name = os.getenv("AZURE_SEARCH_INDEX_NAME", "edi-transactions")
-            
-            if endpoint and api_key:
-                credential = AzureKeyCredential(api_key)
-                self.search_client = SearchClient(
-                    endpoint=endpoint,
-                    index_name=index_name,
-                    credential=credential
-                )
-        except Exception as e:
-            logger.warning(f"Could not initialize Azure Search client: {e}")
-    
-    def extract_query_parameters(self, question: str) -> Dict:
-        """Extract structured parameters from natural language query using AI"""
-        try:
-            # Setup OpenAI client for Azure
-            openai_client = AzureOpenAI(
-                api_version="2024-12-01-preview",
-                api_key=os.getenv("AZURE_OPENAI_KEY"),
-                azure_endpoint="https://charlotte-ai-resource.openai.azure.com/",
-            )
-            
-            # Prompt for parameter extraction
-            system_prompt = """You are an expert at extracting structured data from natural language queries about financial transactions.
+# Configuration read once at import
+AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
+AZURE_OPENAI_API_VERSION = "2024-12-01-preview"
+AZURE_OPENAI_ENDPOINT = "https://charlotte-ai-resource.openai.azure.com/"
+SMALL_MODEL_NAME = os.getenv("SMALL_MODEL_NAME", "gpt-4o-mini")
+AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
+AZURE_SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
+AZURE_SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX_NAME", "edi-transactions")
+
+# HTTP connection pooling for the search and OpenAI clients
+SEARCH_POOL_CONNECTIONS = 16
+SEARCH_POOL_MAXSIZE = 32
+OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+
+# Originator lookups with at most this many hits are answered from a template
+ORIGINATOR_TEMPLATE_MAX_RESULTS = 5
+
+# Seconds to reuse the index-wide transaction count for "count_all" queries
+TOTAL_COUNT_TTL_SECONDS = 60
+
+DEFAULT_QUERY_PARAMS = {
+    "amount": None,
+    "amount_min": None,
+    "amount_max": None,
+    "date": None,
+    "date_start": None,
+    "date_end": None,
+    "trace_number": None,
+    "originator": None,
+    "query_type": "general"
+}
+
+# Prompt for parameter extraction
+PARAMETER_EXTRACTION_PROMPT = """You are an expert at extracting structured data from natural language queries about financial transactions.
 
 Extract the following information from the user's query and return it as valid JSON:
 - amount: float or null (exact monetary amount like $92.39, 103.12 dollars, etc.)
@@ -85,12 +87,114 @@ Query type rules:
 
 Return only valid JSON, no other text."""
 
+# System prompt for RAG response with unified conversation context
+RAG_SYSTEM_PROMPT = """You are a financial transaction assistant with access to EDI transaction data. 
+            
+Your task is to analyze the provided transaction data and answer the user's question comprehensively.
+
+Guidelines:
+- Use the exact transaction data provided in the context
+- Be precise with numbers, dates, and amounts
+- Format monetary amounts clearly (e.g., $1,234.56)
+- If multiple transactions match, provide summaries and key insights
+- For date ranges, provide totals and breakdowns when relevant
+- Use **bold** for important numbers and key information
+- If the user asks for specific trace numbers, provide them clearly
+- If patterns emerge in the data, highlight them
+- Consider the conversation context to provide more relevant and contextual responses
+- Reference previous queries when relevant to provide continuity
+
+{conversation_context}Transaction Data Context:
+{context}
+
+Answer the user's question based on this transaction data and conversation context."""
+
+# Fields projected from the search index for EDI queries
+TRANSACTION_SELECT_FIELDS = ["trace_number", "amount", "effective_date", "originator", "receiver", "page_number"]
+
+
+@dataclass(slots=True)
+class TransactionRow:
+    """Lightweight row for a transaction returned by search_transactions"""
+    trace_number: str
+    amount: float
+    effective_date: str
+    originator: str
+    receiver: str
+    page_number: Optional[str] = None
+
+    @classmethod
+    def from_search_result(cls, result) -> "TransactionRow":
+        return cls(
+            trace_number=result.get("trace_number", ""),
+            amount=result.get("amount", 0.0),
+            effective_date=result.get("effective_date", ""),
+            originator=result.get("originator", ""),
+            receiver=result.get("receiver", ""),
+            page_number=result.get("page_number"),
+        )
+
+
+def is_count_result(transactions: List[Union[TransactionRow, Dict]]) -> bool:
+    """True when search_transactions answered a count_all query"""
+    return len(transactions) == 1 and isinstance(transactions[0], dict) and "total_count" in transactions[0]
+
+
+# EDI Search Service Integration
+class EDISearchIntegration:
+    """Integration class for EDI search in Charlotte"""
+    
+    def __init__(self, unified_memory: UnifiedConversationMemory, conversation_memory: ConversationMemory, project_client=None):
+        self.unified_memory = unified_memory
+        self.conversation_memory = conversation_memory
+        self.project_client = project_client
+        self.search_client = None
+        self.openai_client = None
+        self._total_count_cache: Optional[int] = None
+        self._total_count_cached_at = 0.0
+        self.setup_search_client()
+    
+    def setup_search_client(self):
+        """Initialize Azure Search client"""
+        try:
+            if AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY:
+                credential = AzureKeyCredential(AZURE_SEARCH_API_KEY)
+                # Keep-alive session shared by all requests from this client
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=SEARCH_POOL_CONNECTIONS, pool_maxsize=SEARCH_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                self.search_client = SearchClient(
+                    endpoint=AZURE_SEARCH_ENDPOINT,
+                    index_name=AZURE_SEARCH_INDEX_NAME,
+                    credential=credential,
+                    transport=RequestsTransport(session=session, session_owner=False)
+                )
+        except Exception as e:
+            logger.warning(f"Could not initialize Azure Search client: {e}")
+    
+    def get_openai_client(self) -> AzureOpenAI:
+        """Return the shared Azure OpenAI client, creating it on first use"""
+        if self.openai_client is None:
+            self.openai_client = AzureOpenAI(
+                api_version=AZURE_OPENAI_API_VERSION,
+                api_key=AZURE_OPENAI_KEY,
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                # HTTP/2 multiplexes concurrent completions over one connection
+                http_client=httpx.Client(http2=True, limits=OPENAI_HTTP_LIMITS),
+            )
+        return self.openai_client
+
+    def extract_query_parameters(self, question: str) -> Dict:
+        """Extract structured parameters from natural language query using AI"""
+        try:
+            openai_client = self.get_openai_client()
+
             user_prompt = f"Extract parameters from this query: {question}"
             
             response = openai_client.chat.completions.create(
-                model=os.getenv("SMALL_MODEL_NAME", "gpt-4o-mini"),
+                model=SMALL_MODEL_NAME,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": PARAMETER_EXTRACTION_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.1,
@@ -110,25 +214,12 @@ Return only valid JSON, no other text."""
                 json_text = json_text.replace('```', '').strip()
             
             # Parse JSON response
-            params = json.loads(json_text)
-            
-            # Validate and set defaults
-            default_params = {
-                "amount": None,
-                "amount_min": None,
-                "amount_max": None,
-                "date": None,
-                "date_start": None,
-                "date_end": None,
-                "trace_number": None,
-                "originator": None,
-                "query_type": "general"
-            }
+            params = orjson.loads(json_text)
             
             # Merge with defaults
-            for key in default_params:
+            for key, default in DEFAULT_QUERY_PARAMS.items():
                 if key not in params or params[key] == "":
-                    params[key] = default_params[key]
+                    params[key] = default
             
             logger.info(f"Extracted parameters: {params}")
             return params
@@ -136,19 +227,28 @@ Return only valid JSON, no other text."""
         except Exception as e:
             logger.error(f"Error in AI parameter extraction: {e}")
             # Fallback to basic parameters
-            return {
-                "amount": None,
-                "amount_min": None,
-                "amount_max": None,
-                "date": None,
-                "date_start": None,
-                "date_end": None,
-                "trace_number": None,
-                "originator": None,
-                "query_type": "general"
-            }
+            return dict(DEFAULT_QUERY_PARAMS)
     
-    def search_transactions(self, params: Dict) -> List[Dict]:
+    def get_total_count(self) -> int:
+        """Return the total number of indexed transactions, cached for TOTAL_COUNT_TTL_SECONDS"""
+        now = time.monotonic()
+        if self._total_count_cache is not None and now - self._total_count_cached_at < TOTAL_COUNT_TTL_SECONDS:
+            return self._total_count_cache
+
+        results = self.search_client.search(
+            search_text="*",
+            include_total_count=True,
+            top=0
+        )
+        self._total_count_cache = results.get_count()
+        self._total_count_cached_at = now
+        return self._total_count_cache
+
+    def invalidate_total_count(self):
+        """Drop the cached transaction count (call after the index changes)"""
+        self._total_count_cache = None
+
+    def search_transactions(self, params: Dict) -> List[Union[TransactionRow, Dict]]:
         """Search for transactions based on extracted parameters using flexible filters"""
         if not self.search_client:
             logger.warning("Search client not available")
@@ -190,12 +290,7 @@ Return only valid JSON, no other text."""
                 
             # Handle special query types
             if params.get("query_type") == "count_all":
-                results = self.search_client.search(
-                    search_text="*",
-                    include_total_count=True,
-                    top=0
-                )
-                total_count = results.get_count()
+                total_count = self.get_total_count()
                 logger.info(f"Total transactions count: {total_count}")
                 return [{"total_count": total_count, "query_type": "count_all"}]
             
@@ -213,7 +308,7 @@ Return only valid JSON, no other text."""
             # Execute search
             search_params = {
                 "search_text": search_text,
-                "select": ["trace_number", "amount", "effective_date", "originator", "receiver", "page_number"],
+                "select": TRANSACTION_SELECT_FIELDS,
                 "top": top_count,
                 "include_total_count": True
             }
@@ -230,70 +325,72 @@ Return only valid JSON, no other text."""
             results = self.search_client.search(**search_params)
             
             # Convert results to list
-            result_list = [dict(result) for result in results]
+            result_list = [TransactionRow.from_search_result(result) for result in results]
             total_found = results.get_count() if hasattr(results, 'get_count') else len(result_list)
             
             logger.info(f"Search returned {len(result_list)} results out of {total_found} total matches")
             
-            # Add metadata about the search
-            if result_list:
-                result_list[0]["_search_metadata"] = {
-                    "total_matches": total_found,
-                    "returned_count": len(result_list),
-                    "query_params": params
-                }
-            
             return result_list
             
         except Exception as e:
             logger.error(f"Search error: {e}")
             return []
     
-    def prepare_context(self, transactions: List[Dict]) -> str:
+    def prepare_context(self, transactions: List[Union[TransactionRow, Dict]]) -> str:
         """Prepare transaction data as context for the LLM"""
         if not transactions:
             return "No transactions found."
             
         # Handle count_all queries
-        if len(transactions) == 1 and "total_count" in transactions[0]:
+        if is_count_result(transactions):
             return f"Total transactions in database: {transactions[0]['total_count']}"
         
-        # Filter out metadata from first transaction if present
-        clean_transactions = []
-        for t in transactions:
-            if "_search_metadata" in t:
-                metadata = t.pop("_search_metadata")
-                # Use metadata for summary if needed
-            clean_transactions.append(t)
-        
         # Format transactions as structured context
         context_parts = []
-        context_parts.append(f"Found {len(clean_transactions)} transactions:\n")
+        context_parts.append(f"Found {len(transactions)} transactions:\n")
         
-        for i, t in enumerate(clean_transactions[:50], 1):  # Limit to first 50 for context
+        for i, t in enumerate(transactions[:50], 1):  # Limit to first 50 for context
             context_parts.append(
-                f"{i}. Trace: {t.get('trace_number', 'N/A')}, "
-                f"Amount: ${t.get('amount', 0):.2f}, "
-                f"Date: {t.get('effective_date', 'N/A')}, "
-                f"From: {t.get('originator', 'N/A')}, "
-                f"To: {t.get('receiver', 'N/A')}"
+                f"{i}. Trace: {t.trace_number or 'N/A'}, "
+                f"Amount: ${t.amount or 0:.2f}, "
+                f"Date: {t.effective_date or 'N/A'}, "
+                f"From: {t.originator or 'N/A'}, "
+                f"To: {t.receiver or 'N/A'}"
             )
         
-        if len(clean_transactions) > 50:
-            context_parts.append(f"\n... and {len(clean_transactions) - 50} more transactions")
+        if len(transactions) > 50:
+            context_parts.append(f"\n... and {len(transactions) - 50} more transactions")
             
         return "\n".join(context_parts)
     
-    def generate_rag_response(self, question: str, transactions: List[Dict], params: Dict, conversation_id: str = None) -> str:
+    def render_count_answer(self, total_count: int) -> str:
+        """Answer a count_all query without calling the LLM"""
+        return f"I have **{total_count:,}** EDI transactions in the database."
+
+    def render_originator_answer(self, originator: str, transactions: List[TransactionRow]) -> Optional[str]:
+        """Answer a small originator lookup without calling the LLM.
+
+        The originator search is full-text and can also return partial matches, so
+        None is returned unless every row is from the requested originator.
+        """
+        wanted = originator.strip().casefold()
+        if any((t.originator or "").strip().casefold() != wanted for t in transactions):
+            return None
+        total = sum(t.amount or 0 for t in transactions)
+        noun = "transaction" if len(transactions) == 1 else "transactions"
+        lines = [f"I found **{len(transactions)}** {noun} from **{originator}** totaling **${total:,.2f}**:\n"]
+        for t in transactions:
+            lines.append(
+                f"- **${t.amount or 0:,.2f}** on {t.effective_date or 'N/A'} "
+                f"to {t.receiver or 'N/A'} (Trace: {t.trace_number or 'N/A'})"
+            )
+        return "\n".join(lines)
+
+    def generate_rag_response(self, question: str, transactions: List[Union[TransactionRow, Dict]], params: Dict, conversation_id: str = None) -> str:
         """Generate RAG response by feeding transaction context to LLM with unified conversation memory"""
         try:
-            # Setup OpenAI client
-            openai_client = AzureOpenAI(
-                api_version="2024-12-01-preview",
-                api_key=os.getenv("AZURE_OPENAI_KEY"),
-                azure_endpoint="https://charlotte-ai-resource.openai.azure.com/",
-            )
-            
+            openai_client = self.get_openai_client()
+
             # Prepare context from transactions
             context = self.prepare_context(transactions)
             
@@ -346,38 +443,15 @@ Return only valid JSON, no other text."""
                 return "I couldn't find any transactions matching your query. Please check the criteria and try again."
             
             # Handle count queries
-            if len(transactions) == 1 and "total_count" in transactions[0]:
-                count = transactions[0]["total_count"]
-                return f"I have **{count:,}** EDI transactions in the database."
-            
-            # Create system prompt for RAG response with unified conversation context
-            system_prompt = """You are a financial transaction assistant with access to EDI transaction data. 
+            if is_count_result(transactions):
+                return self.render_count_answer(transactions[0]["total_count"])
             
-Your task is to analyze the provided transaction data and answer the user's question comprehensively.
-
-Guidelines:
-- Use the exact transaction data provided in the context
-- Be precise with numbers, dates, and amounts
-- Format monetary amounts clearly (e.g., $1,234.56)
-- If multiple transactions match, provide summaries and key insights
-- For date ranges, provide totals and breakdowns when relevant
-- Use **bold** for important numbers and key information
-- If the user asks for specific trace numbers, provide them clearly
-- If patterns emerge in the data, highlight them
-- Consider the conversation context to provide more relevant and contextual responses
-- Reference previous queries when relevant to provide continuity
-
-{conversation_context}Transaction Data Context:
-{context}
-
-Answer the user's question based on this transaction data and conversation context."""
-
             user_prompt = f"User's question: {question}\n\nPlease analyze the transaction data and provide a comprehensive answer."
             
             response = openai_client.chat.completions.create(
-                model=os.getenv("SMALL_MODEL_NAME", "gpt-4o-mini"),
+                model=SMALL_MODEL_NAME,
                 messages=[
-                    {"role": "system", "content": system_prompt.format(
+                    {"role": "system", "content": RAG_SYSTEM_PROMPT.format(
                         conversation_context=conversation_context,
                         context=context
                     )},
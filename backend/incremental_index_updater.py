@@ -4,16 +4,16 @@ This module handles tracking processed files and updating the search index with
 """
 
 import os
-import json
+import orjson
 import logging
 from datetime import datetime
 from typing import List, Dict, Set, Optional, Tuple
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
-from azure.azure_blob_container_client import AzureBlobContainerClient
-from edi_preprocessor import EDITransactionExtractor
-from azure.azure_search_setup import EDISearchService, setup_azure_search_from_env
+from azure.azure_blob_container_client import get_shared_container_client
+from edi_preprocessor import EDITransactionExtractor, Transaction
+from azure.azure_search_setup import EDISearchService, get_edi_search_service
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -44,19 +44,18 @@ class IncrementalIndexUpdater:
         if not self.connection_string:
             raise ValueError("AZURE_STORAGE_CONNECTION_STRING is required")
 
-        self.source_client = AzureBlobContainerClient(self.connection_string, self.source_container)
-        self.metadata_client = AzureBlobContainerClient(self.connection_string, self.metadata_container)
+        self.source_client = get_shared_container_client(self.connection_string, self.source_container)
+        self.metadata_client = get_shared_container_client(self.connection_string, self.metadata_container)
 
         # Initialize processors
         self.extractor = EDITransactionExtractor()
-        self.search_service = setup_azure_search_from_env()
+        self.search_service = get_edi_search_service()
 
     def load_processed_files_registry(self) -> Dict[str, ProcessedFileInfo]:
         """Load the registry of processed files from Azure Blob Storage"""
         try:
             data_bytes = self.metadata_client.download_blob_bytes(self.metadata_blob_name)
-            data_text = data_bytes.decode('utf-8')
-            registry_data = json.loads(data_text)
+            registry_data = orjson.loads(data_bytes)
 
             # Convert to ProcessedFileInfo objects
             registry = {}
@@ -90,7 +89,7 @@ class IncrementalIndexUpdater:
                     'transaction_count': info.transaction_count
                 }
 
-            data_bytes = json.dumps(registry_data, indent=2).encode('utf-8')
+            data_bytes = orjson.dumps(registry_data, option=orjson.OPT_INDENT_2)
             self.metadata_client.upload_blob(self.metadata_blob_name, data_bytes, overwrite=True)
 
             logger.info(f"Saved registry with {len(registry)} processed files")
@@ -123,16 +122,20 @@ class IncrementalIndexUpdater:
         new_files = []
 
         try:
-            # Get all PDF blobs from source container
+            # Get all PDF blobs from source container. The listing already carries
+            # size and last_modified, so known files are ruled out without a
+            # per-blob properties request
             current_blobs = {}
             for blob in self.source_client.list_blobs():
                 blob_name = getattr(blob, 'name', '')
                 if not blob_name.lower().endswith('.pdf'):
                     continue
 
-                blob_info = self.get_blob_info(blob_name)
-                if blob_info:
-                    current_blobs[blob_name] = blob_info
+                current_blobs[blob_name] = {
+                    'name': blob_name,
+                    'size': blob.size,
+                    'last_modified': blob.last_modified.isoformat()
+                }
 
             logger.info(f"Found {len(current_blobs)} PDF files in source container")
 
@@ -157,7 +160,7 @@ class IncrementalIndexUpdater:
             logger.error(f"Error finding new files: {e}")
             return [], registry
 
-    def process_files_incrementally(self, file_list: List[str]) -> Tuple[List[Dict], int]:
+    def process_files_incrementally(self, file_list: List[str]) -> Tuple[List[Transaction], int]:
         """
         Process only the specified files and extract transactions
         Returns: (transactions, total_count)
@@ -178,18 +181,14 @@ class IncrementalIndexUpdater:
                     logger.warning(f"No text extracted from {blob_name}")
                     continue
 
-                pages = self.extractor.split_pages(text)
                 file_transactions = []
 
-                for page_text in pages:
-                    if 'PAYMENT INFORMATION:' in page_text and 'CREDIT:' in page_text:
-                        transaction = self.extractor.parse_page_content(page_text, blob_name)
-                        if transaction:
-                            file_transactions.append(transaction)
+                for page_text in self.extractor.iter_payment_pages(text):
+                    transaction = self.extractor.parse_page_content(page_text, blob_name)
+                    if transaction:
+                        file_transactions.append(transaction)
 
-                # Convert to dictionaries
-                for transaction in file_transactions:
-                    all_transactions.append(transaction.to_dict())
+                all_transactions.extend(file_transactions)
 
                 logger.info(f"Extracted {len(file_transactions)} transactions from {blob_name}")
 
@@ -200,7 +199,7 @@ class IncrementalIndexUpdater:
         logger.info(f"Total transactions extracted: {len(all_transactions)}")
         return all_transactions, len(all_transactions)
 
-    def update_search_index_incrementally(self, new_transactions: List[Dict]) -> bool:
+    def update_search_index_incrementally(self, new_transactions: List[Transaction]) -> bool:
         """Add new transactions to the existing search index"""
         if not new_transactions:
             logger.info("No new transactions to add to search index")
@@ -218,18 +217,18 @@ class IncrementalIndexUpdater:
             for i, transaction in enumerate(new_transactions, start=current_count + 1):
                 doc = {
                     "id": str(i),
-                    "trace_number": transaction.get("trace_number", ""),
-                    "amount": transaction.get("amount", 0.0),
-                    "effective_date": transaction.get("effective_date", ""),
-                    "receiver": transaction.get("receiver", ""),
-                    "originator": transaction.get("originator", ""),
-                    "page_number": transaction.get("page_number", ""),
-                    "routing_id_credit": transaction.get("routing_id_credit", ""),
-                    "routing_id_debit": transaction.get("routing_id_debit", ""),
-                    "company_id_debit": transaction.get("company_id_debit", ""),
-                    "mutually_defined": transaction.get("mutually_defined", ""),
-                    "file_name": transaction.get("file_name", ""),
-                    "searchable_text": f"{transaction.get('amount', 0)} {transaction.get('effective_date', '')} {transaction.get('receiver', '')} {transaction.get('originator', '')} {transaction.get('trace_number', '')}"
+                    "trace_number": transaction.trace_number,
+                    "amount": transaction.amount,
+                    "effective_date": transaction.effective_date,
+                    "receiver": transaction.receiver,
+                    "originator": transaction.originator,
+                    "page_number": transaction.page_number,
+                    "routing_id_credit": transaction.routing_id_credit,
+                    "routing_id_debit": transaction.routing_id_debit,
+                    "company_id_debit": transaction.company_id_debit,
+                    "mutually_defined": transaction.mutually_defined,
+                    "file_name": transaction.file_name,
+                    "searchable_text": f"{transaction.amount} {transaction.effective_date} {transaction.receiver} {transaction.originator} {transaction.trace_number}"
                 }
                 search_documents.append(doc)
 
@@ -296,7 +295,7 @@ class IncrementalIndexUpdater:
                 # Count transactions per file for registry update
                 transaction_counts = {}
                 for transaction in new_transactions:
-                    file_name = transaction.get('file_name', '')
+                    file_name = transaction.file_name
                     transaction_counts[file_name] = transaction_counts.get(file_name, 0) + 1
 
                 # Update registry
@@ -1,9 +1,11 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, ORJSONResponse
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 import os
+import asyncio
+import gzip
 from typing import List, Optional, Dict
 import logging
 from contextlib import asynccontextmanager
@@ -17,11 +19,11 @@ import pandas as pd
 import numpy as np
 from auth import get_current_user, require_unc_email, get_optional_user
 from edi_preprocessor import EDIProcessor
-from azure.azure_blob_container_client import AzureBlobContainerClient
+from azure.azure_blob_container_client import AzureBlobContainerClient, get_shared_container_client
 from incremental_index_updater import IncrementalIndexUpdater
 from azure.azure_client import AzureClient
-from edi_search_integration import EDISearchIntegration
-from edi_json_to_excel import EDIDataLoader
+from edi_search_integration import EDISearchIntegration, TransactionRow, is_count_result, ORIGINATOR_TEMPLATE_MAX_RESULTS
+from edi_json_to_excel import EDIDataLoader, EDI_ANALYSIS_FIELDS, clear_search_records_cache
 from align_rx_json_to_excel import AlignRxDataLoader
 from alignRx_parser import AlignRxParser, DuplicateReportError
 
@@ -43,11 +45,12 @@ from azure.ai.agents.models import ListSortOrder
 from azure.identity import ClientSecretCredential
 from azure.search.documents import SearchClient
 from azure.core.credentials import AzureKeyCredential
+from azure.storage.blob import ContentSettings
 from conversation_memory import UnifiedConversationMemory
 from conversation_memory import ConversationMemory
 from azure.azure_cosmos_client import AzureCosmosClient
 from align_rx_json_to_excel import AlignRxDataLoader
-from azure.azure_alignRx_search_setup import AlignRxSearchService
+from azure.azure_alignRx_search_setup import get_alignrx_search_service
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -129,6 +132,7 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title="Charlotte",
               description="Charlotte is a chatbot that can answer questions about the UNC Charlotte campus and its resources.",
               version="1.0.0",
+              default_response_class=ORJSONResponse,
               lifespan=lifespan)
 
 # Configure CORS
@@ -146,6 +150,37 @@ conversation_memory = ConversationMemory(unified_memory)
 edi_search = EDISearchIntegration(unified_memory, conversation_memory)
 cosmos_client = AzureCosmosClient()
 
+
+def _df_to_records(d: Optional[pd.DataFrame]) -> List[Dict]:
+    """Convert an analysis DataFrame to JSON-ready records, with NaN/NaT as None."""
+    if d is None or getattr(d, 'empty', True):
+        return []
+    return d.astype(object).where(d.notna(), None).to_dict(orient="records")
+
+
+# Uploaded EDI reports with these extensions are stored gzip-encoded
+GZIP_UPLOAD_EXTENSIONS = {'.txt', '.csv'}
+
+# Held while an incremental search index update runs
+_index_update_lock = asyncio.Lock()
+
+
+def _blob_container(container_name: str) -> AzureBlobContainerClient:
+    """Return the shared client for a storage container, or fail with 500 if storage is not configured."""
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    if not connection_string:
+        raise HTTPException(status_code=500, detail="Azure Storage configuration not found")
+    return get_shared_container_client(connection_string, container_name)
+
+
+def get_edi_reports_container() -> AzureBlobContainerClient:
+    return _blob_container("edi-reports")
+
+
+def get_alignrx_reports_container() -> AzureBlobContainerClient:
+    return _blob_container("alignrx-reports")
+
+
 # Protected Routes
 @app.post("/api/query", response_model=QueryResponse)
 async def query(request: QueryRequest, user: Dict = Depends(require_unc_email)):
@@ -259,21 +294,32 @@ async def query_edi_transactions(query: EDIQuery, user: Dict = Depends(require_u
         transactions = edi_search.search_transactions(params)
         logger.info(f"Found {len(transactions)} transactions")
         
-        # Convert to response format
+        # Convert to response format; results come from our own index schema,
+        # so skip per-field validation when building the (up to 1000) rows
         transaction_results = [
-            TransactionResult(
-                trace_number=t.get('trace_number', ''),
-                amount=t.get('amount', 0.0),
-                effective_date=t.get('effective_date', ''),
-                originator=t.get('originator', ''),
-                receiver=t.get('receiver', ''),
-                page_number=t.get('page_number')
+            TransactionResult.model_construct(
+                trace_number=t.trace_number,
+                amount=t.amount,
+                effective_date=t.effective_date,
+                originator=t.originator,
+                receiver=t.receiver,
+                page_number=t.page_number
             )
             for t in transactions
+            if isinstance(t, TransactionRow)
         ]
         
-        # Generate RAG response using LLM with conversation context
-        ai_answer = edi_search.generate_rag_response(query.question, transactions, params, conversation_id)
+        # Answer counts and small originator lookups directly; everything else goes through the LLM
+        ai_answer = None
+        if is_count_result(transactions):
+            ai_answer = edi_search.render_count_answer(transactions[0]["total_count"])
+        elif (params["query_type"] == "originator_search" and params.get("originator")
+              and 0 < len(transaction_results) <= ORIGINATOR_TEMPLATE_MAX_RESULTS):
+            # None when the full-text search also matched other originators
+            ai_answer = edi_search.render_originator_answer(params["originator"], transactions)
+        if ai_answer is None:
+            # Generate RAG response using LLM with conversation context
+            ai_answer = edi_search.generate_rag_response(query.question, transactions, params, conversation_id)
         
         # Add assistant response to conversation memory
         conversation_memory.add_message(
@@ -305,38 +351,19 @@ async def analyze_edi_range(request: EDIAnalysisRequest, user: Dict = Depends(re
     """Analyze EDI transactions between start and end dates (YYYY-MM-DD)."""
     try:
         loader = EDIDataLoader(request.start, request.end)
-        records = loader.load_edi_json(request.start, request.end)
+        records = loader.load_edi_json(request.start, request.end, select=EDI_ANALYSIS_FIELDS)
         df = loader.to_dataframe(records)
         analyses = loader.analyze(df)
 
-        # Convert DataFrames to JSON-serializable structures
-        def df_to_records(d):
-            if d is None or getattr(d, 'empty', True):
-                return []
-            # Convert to dict first, then replace NaN values with None for JSON serialization
-            records = d.to_dict(orient="records")
-            # Clean NaN values from the records
-            cleaned_records = []
-            for record in records:
-                cleaned_record = {}
-                for key, value in record.items():
-                    # Check if value is NaN using pandas isna (handles all NaN types)
-                    if pd.isna(value):
-                        cleaned_record[key] = None
-                    else:
-                        cleaned_record[key] = value
-                cleaned_records.append(cleaned_record)
-            return cleaned_records
-
         return {
             "success": True,
             "range": {"start": request.start, "end": request.end},
             "row_count": len(df) if df is not None else 0,
             "analyses": {
-                "summary_totals": df_to_records(analyses.get("summary_totals")),
-                "daily_totals": df_to_records(analyses.get("daily_totals")),
-                "by_originator": df_to_records(analyses.get("by_originator")),
-                "by_receiver": df_to_records(analyses.get("by_receiver")),
+                "summary_totals": _df_to_records(analyses.get("summary_totals")),
+                "daily_totals": _df_to_records(analyses.get("daily_totals")),
+                "by_originator": _df_to_records(analyses.get("by_originator")),
+                "by_receiver": _df_to_records(analyses.get("by_receiver")),
             },
         }
     except HTTPException:
@@ -355,34 +382,15 @@ async def analyze_alignrx_range(request: EDIAnalysisRequest, user: Dict = Depend
         records = loader._load_search_records(request.start, request.end)
         df = loader.to_dataframe(records)
         analyses = loader.analyze(df)
-        # Convert DataFrames to JSON-serializable structures
-        def df_to_records(d):
-            if d is None or getattr(d, 'empty', True):
-                return []
-            # Convert to dict first, then replace NaN values with None for JSON serialization
-            records = d.to_dict(orient="records")
-            # Clean NaN values from the records
-            cleaned_records = []
-            for record in records:
-                cleaned_record = {}
-                for key, value in record.items():
-                    # Check if value is NaN using pandas isna (handles all NaN types)
-                    if pd.isna(value):
-                        cleaned_record[key] = None
-                    else:
-                        cleaned_record[key] = value
-                cleaned_records.append(cleaned_record)
-            return cleaned_records
-
         return {
             "success": True,
             "range": {"start": request.start, "end": request.end},
             "row_count": len(df) if df is not None else 0,
             "analyses": {
-                "summary_totals": df_to_records(analyses.get("summary_totals")),
-                "daily_totals": df_to_records(analyses.get("daily_totals")),
-                "by_destination": df_to_records(analyses.get("by_destination")),
-                "by_sender": df_to_records(analyses.get("by_sender")),
+                "summary_totals": _df_to_records(analyses.get("summary_totals")),
+                "daily_totals": _df_to_records(analyses.get("daily_totals")),
+                "by_destination": _df_to_records(analyses.get("by_destination")),
+                "by_sender": _df_to_records(analyses.get("by_sender")),
             },
         }
     except HTTPException:
@@ -524,7 +532,8 @@ async def enhanced_chat(request: QueryRequest, user: Dict = Depends(require_unc_
 @app.post("/api/alignrx/upload-report")
 async def upload_alignrx_report(
     file: UploadFile = File(...),
-    user: Dict = Depends(require_unc_email)
+    user: Dict = Depends(require_unc_email),
+    blob_client: AzureBlobContainerClient = Depends(get_alignrx_reports_container)
 ):
     """Upload AlignRx Excel report, parse it, and index parsed data into Azure AI Search."""
 
@@ -597,15 +606,6 @@ async def upload_alignrx_report(
                 detail=f"Report already exists in search index. The file data matches an existing report with the same date, destination, and payment amount."
             )
 
-        # Initialize Azure Blob client for alignrx-reports container
-        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        container_name = "alignrx-reports"
-
-        if not connection_string:
-            raise HTTPException(status_code=500, detail="Azure Storage configuration not found")
-
-        blob_client = AzureBlobContainerClient(connection_string, container_name)
-
         # Use original filename so Azure duplicate detection can work
         blob_name = file.filename
 
@@ -660,7 +660,7 @@ async def upload_alignrx_report(
             # Remove keys with None to avoid schema mismatches
             index_doc = {k: v for k, v in index_doc.items() if v is not None}
 
-            alignrx_search = AlignRxSearchService()
+            alignrx_search = get_alignrx_search_service()
             index_success = alignrx_search.upload_documents([index_doc])
         except Exception as e:
             logger.error(f"Error uploading parsed AlignRx document to search index: {str(e)}")
@@ -689,7 +689,8 @@ async def upload_alignrx_report(
 @app.post("/api/upload-edi-report")
 async def upload_edi_report(
     file: UploadFile = File(...),
-    user: Dict = Depends(require_unc_email)
+    user: Dict = Depends(require_unc_email),
+    blob_client: AzureBlobContainerClient = Depends(get_edi_reports_container)
 ):
     """Upload EDI report to Azure Blob Storage"""
 
@@ -704,27 +705,37 @@ async def upload_edi_report(
                 detail=f"File type {file_extension} not allowed. Allowed types: {', '.join(allowed_extensions)}"
             )
 
-        # Read file content
-        file_content = await file.read()
+        # Measure the spooled upload instead of reading it into memory
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        file.file.seek(0)
 
-        if len(file_content) == 0:
+        if file_size == 0:
             raise HTTPException(status_code=400, detail="File is empty")
 
-        # Initialize Azure Blob client for edi-reports container
-        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        container_name = "edi-reports"
-
-        if not connection_string:
-            raise HTTPException(status_code=500, detail="Azure Storage configuration not found")
-
-        blob_client = AzureBlobContainerClient(connection_string, container_name)
-
         # Use original filename to allow Azure's duplicate detection to work
         blob_name = file.filename
 
-        # Upload to Azure Blob Storage - let Azure handle duplicates
+        # Reject duplicates before compressing or sending the body
+        if blob_client.blob_exists(blob_name):
+            raise HTTPException(
+                status_code=409,
+                detail=f"File '{file.filename}' already exists in the container"
+            )
+
+        # Text reports compress well; store them gzip-encoded and stream everything else as-is
+        upload_kwargs = {}
+        if file_extension in GZIP_UPLOAD_EXTENSIONS:
+            upload_data = gzip.compress(file.file.read(), compresslevel=1)
+            upload_length = len(upload_data)
+            upload_kwargs["content_settings"] = ContentSettings(content_encoding="gzip")
+        else:
+            upload_data = file.file
+            upload_length = file_size
+
+        # Upload to Azure Blob Storage - Azure still rejects a duplicate uploaded meanwhile
         try:
-            blob_client.upload_blob(blob_name, file_content, overwrite=False)
+            blob_client.upload_blob(blob_name, upload_data, overwrite=False, length=upload_length, **upload_kwargs)
         except Exception as upload_error:
             # If file already exists, Azure will raise an exception
             if "BlobAlreadyExists" in str(upload_error) or "already exists" in str(upload_error).lower():
@@ -743,7 +754,7 @@ async def upload_edi_report(
             "message": "File uploaded successfully",
             "filename": file.filename,
             "blob_name": blob_name,
-            "size": len(file_content),
+            "size": file_size,
             "uploaded_by": user.get('email') if user and isinstance(user, dict) else None
         }
 
@@ -758,42 +769,51 @@ async def upload_edi_report(
 async def update_search_index(user: Dict = Depends(require_unc_email)):
     """Update search index with new EDI files incrementally"""
 
-    try:
-        user_email = user.get('email', 'unknown') if user and isinstance(user, dict) else 'unknown'
-        logger.info(f"Starting incremental search index update requested by {user_email}")
+    # Runs must not overlap: each one assigns document ids from the current
+    # index count and rewrites the processed-files registry
+    if _index_update_lock.locked():
+        raise HTTPException(status_code=409, detail="Search index update already running")
 
-        # Initialize the incremental updater
-        updater = IncrementalIndexUpdater()
-
-        # Perform the incremental update
-        result = updater.perform_incremental_update()
+    async with _index_update_lock:
+        try:
+            user_email = user.get('email', 'unknown') if user and isinstance(user, dict) else 'unknown'
+            logger.info(f"Starting incremental search index update requested by {user_email}")
+
+            # Initialize the incremental updater
+            updater = IncrementalIndexUpdater()
+
+            # Perform the incremental update on a worker thread so the event loop
+            # keeps serving other requests while blobs are parsed and uploaded
+            result = await asyncio.to_thread(updater.perform_incremental_update)
+
+            if result["success"]:
+                logger.info(f"Incremental update completed: {result['message']}")
+                edi_search.invalidate_total_count()
+                clear_search_records_cache()
+                return {
+                    "success": True,
+                    "message": result["message"],
+                    "details": {
+                        "new_files_processed": result.get("new_files_count", 0),
+                        "transactions_added": result.get("transactions_added", 0),
+                        "processed_files": result.get("processed_files", [])
+                    },
+                    "updated_by": user.get('email') if user and isinstance(user, dict) else None
+                }
+            else:
+                logger.error(f"Incremental update failed: {result['message']}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Search index update failed: {result['message']}"
+                )
 
-        if result["success"]:
-            logger.info(f"Incremental update completed: {result['message']}")
-            return {
-                "success": True,
-                "message": result["message"],
-                "details": {
-                    "new_files_processed": result.get("new_files_count", 0),
-                    "transactions_added": result.get("transactions_added", 0),
-                    "processed_files": result.get("processed_files", [])
-                },
-                "updated_by": user.get('email') if user and isinstance(user, dict) else None
-            }
-        else:
-            logger.error(f"Incremental update failed: {result['message']}")
+        except Exception as e:
+            logger.error(f"Error in incremental search index update: {str(e)}")
             raise HTTPException(
                 status_code=500,
-                detail=f"Search index update failed: {result['message']}"
+                detail=f"Failed to update search index: {str(e)}"
             )
 
-    except Exception as e:
-        logger.error(f"Error in incremental search index update: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to update search index: {str(e)}"
-        )
-
 
 
 
@@ -880,18 +900,10 @@ async def delete_session(session_id: str, user: Dict = Depends(require_unc_email
 
 
 @app.get("/api/edi/reports")
-async def get_edi_reports(user: Dict = Depends(require_unc_email)):
+async def get_edi_reports(user: Dict = Depends(require_unc_email),
+                          blob_client: AzureBlobContainerClient = Depends(get_edi_reports_container)):
     """Get list of EDI reports from Azure Blob Storage"""
     try:
-        # Initialize Azure Blob client for edi-reports container
-        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        container_name = "edi-reports"
-
-        if not connection_string:
-            raise HTTPException(status_code=500, detail="Azure Storage configuration not found")
-
-        blob_client = AzureBlobContainerClient(connection_string, container_name)
-        
         # List all blobs in the container
         blobs = blob_client.list_blobs()
         
@@ -940,18 +952,10 @@ async def get_edi_reports(user: Dict = Depends(require_unc_email)):
 
 
 @app.get("/api/edi/reports/{filename}")
-async def get_edi_report(filename: str, user: Dict = Depends(require_unc_email)):
+async def get_edi_report(filename: str, user: Dict = Depends(require_unc_email),
+                         blob_client: AzureBlobContainerClient = Depends(get_edi_reports_container)):
     """Get a specific EDI report file from Azure Blob Storage"""
     try:
-        # Initialize Azure Blob client for edi-reports container
-        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        container_name = "edi-reports"
-
-        if not connection_string:
-            raise HTTPException(status_code=500, detail="Azure Storage configuration not found")
-
-        blob_client = AzureBlobContainerClient(connection_string, container_name)
-        
         # Get blob content
         blob_content = blob_client.download_blob(filename)
         
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Script to create or update the AlignRx Azure AI Search index from remittance-index.json.
+
+When the served index already matches the definition the script exits without
+writing anything. Additive schema changes (new fields, new filterable/facetable
+simple fields) are applied in place with create_or_update_index, so existing
+documents are kept.
+Only when Azure rejects the change as incompatible does the script offer to
+delete and recreate the index, which removes all indexed documents.
+
+Usage:
+    python backend/scripts/apply_alignrx_index.py
+
+    Or from the backend directory:
+    python scripts/apply_alignrx_index.py
+
+    Pass --yes to recreate an incompatible index without prompting.
+"""
+
+import os
+import sys
+import json
+from pathlib import Path
+
+# Add the backend directory to the path so we can import modules
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from dotenv import load_dotenv
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.indexes.models import SearchIndex
+from azure.azure_alignRx_search_setup import BULK_RETRY_OPTIONS
+import logging
+
+# Load environment variables from backend/.env; variables already set in the
+# process environment take precedence (override=False)
+load_dotenv(dotenv_path=backend_dir / ".env", override=False)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+INDEX_DEFINITION_PATH = backend_dir / "remittance-index.json"
+
+# Parsed once at import so the schema can be inspected without running main()
+with open(INDEX_DEFINITION_PATH, "r") as _definition_file:
+    INDEX_DEFINITION = json.load(_definition_file)
+
+
+def load_index_definition(index_name: str) -> SearchIndex:
+    """Build the SearchIndex model from the definition, targeted at index_name"""
+    return SearchIndex.from_dict({**INDEX_DEFINITION, "name": index_name})
+
+
+def matches_definition(wanted, served) -> bool:
+    """True if every attribute set in wanted has the same value in served.
+
+    The service echoes defaults the definition leaves out (e.g. stored,
+    synonymMaps), so only the attributes present in wanted are compared.
+    """
+    if isinstance(wanted, dict):
+        return isinstance(served, dict) and all(
+            matches_definition(value, served.get(key)) for key, value in wanted.items()
+        )
+    if isinstance(wanted, list):
+        served = served or []
+        return len(wanted) == len(served) and all(
+            matches_definition(w, s) for w, s in zip(wanted, served)
+        )
+    return wanted == served
+
+
+def main():
+    """Main function to create or update the AlignRx search index"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create or update the AlignRx search index")
+    parser.add_argument("--yes", action="store_true", help="Recreate the index without prompting if needed")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("AlignRx Azure AI Search Index - Create or Update")
+    print("=" * 60)
+    print()
+
+    # Verify environment variables
+    endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+    api_key = os.getenv("AZURE_SEARCH_API_KEY")
+    index_name = os.getenv("AZURE_ALIGN_RX_SEARCH_INDEX_NAME", "alignrx-reports")
+
+    if not endpoint or not api_key:
+        print("ERROR: Missing required environment variables!")
+        print("Please set AZURE_SEARCH_ENDPOINT and AZURE_SEARCH_API_KEY")
+        print("in your backend/.env file or environment variables.")
+        sys.exit(1)
+
+    print(f"Endpoint: {endpoint}")
+    print(f"Index Name: {index_name}")
+    print(f"Definition: {INDEX_DEFINITION_PATH}")
+    print()
+
+    index = load_index_definition(index_name)
+    index_client = SearchIndexClient(
+        endpoint=endpoint,
+        credential=AzureKeyCredential(api_key),
+        **BULK_RETRY_OPTIONS
+    )
+
+    # Steady state: the served schema already matches, so skip the update call
+    try:
+        if matches_definition(index.serialize(), index_client.get_index(index_name).serialize()):
+            print("✓ SUCCESS")
+            print(f"  Index '{index_name}' already matches the definition; nothing to update")
+            return
+    except ResourceNotFoundError:
+        pass
+
+    try:
+        # Non-destructive path: creates the index, or applies compatible changes in place
+        index_client.create_or_update_index(index)
+        print("✓ SUCCESS")
+        print(f"  Index '{index_name}' is up to date with the definition")
+        return
+    except HttpResponseError as e:
+        logger.error(f"Index update rejected: {e}")
+
+    # Azure rejected the change (e.g. a field's type or key changed); the only
+    # way to apply it is to drop the index together with its documents
+    try:
+        existing = index_client.get_index(index_name)
+        existing_fields = {field.name for field in existing.fields}
+        new_fields = {field.name for field in index.fields}
+        print()
+        print("The definition is not compatible with the existing index.")
+        print(f"  Fields removed: {sorted(existing_fields - new_fields) or 'none'}")
+        print(f"  Fields added: {sorted(new_fields - existing_fields) or 'none'}")
+    except ResourceNotFoundError:
+        print("ERROR: Index could not be created from the definition.")
+        sys.exit(1)
+
+    print()
+    print("WARNING: Recreating the index deletes ALL of its documents!")
+    print("Reports must be re-uploaded afterwards.")
+    print()
+
+    if not args.yes:
+        response = input("Delete and recreate the index? (yes/no): ").strip().lower()
+
+        if response not in ['yes', 'y']:
+            print("Operation cancelled.")
+            sys.exit(0)
+
+    try:
+        index_client.delete_index(index_name)
+        index_client.create_index(index)
+        print("✓ SUCCESS")
+        print(f"  Index '{index_name}' recreated from the definition")
+    except Exception as e:
+        logger.error(f"Error recreating index: {e}", exc_info=True)
+        print("✗ ERROR")
+        print(f"  Failed to recreate index: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
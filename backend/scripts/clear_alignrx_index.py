@@ -10,6 +10,8 @@ Usage:
     
     Or from the backend directory:
     python scripts/clear_alignrx_index.py
+
+    Pass --yes to skip the confirmation prompt (e.g. in scheduled jobs).
 """
 
 import os
@@ -21,12 +23,12 @@ backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
 from dotenv import load_dotenv
-from azure.azure_alignRx_search_setup import AlignRxSearchService
+from azure.azure_alignRx_search_setup import AlignRxSearchService, BULK_RETRY_OPTIONS
 import logging
 
-# Load environment variables
-load_dotenv(dotenv_path=backend_dir / ".env")
-load_dotenv()  # Also load from process environment
+# Load environment variables from backend/.env; variables already set in the
+# process environment take precedence (override=False)
+load_dotenv(dotenv_path=backend_dir / ".env", override=False)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -37,7 +39,12 @@ logger = logging.getLogger(__name__)
 
 def main():
     """Main function to clear the AlignRx search index"""
-    
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Delete all documents from the AlignRx search index")
+    parser.add_argument("--yes", action="store_true", help="Skip the confirmation prompt")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("AlignRx Azure AI Search Index - Clear All Documents")
     print("=" * 60)
@@ -63,18 +70,19 @@ def main():
     print("This action cannot be undone.")
     print()
     
-    response = input("Are you sure you want to continue? (yes/no): ").strip().lower()
-    
-    if response not in ['yes', 'y']:
-        print("Operation cancelled.")
-        sys.exit(0)
+    if not args.yes:
+        response = input("Are you sure you want to continue? (yes/no): ").strip().lower()
+
+        if response not in ['yes', 'y']:
+            print("Operation cancelled.")
+            sys.exit(0)
     
     print()
     print("Connecting to Azure AI Search...")
     
     try:
         # Initialize the search service
-        search_service = AlignRxSearchService()
+        search_service = AlignRxSearchService(retry_options=BULK_RETRY_OPTIONS)
         
         # Get statistics before deletion
         stats = search_service.get_statistics()